@@ -34,3 +34,14 @@ CREATE INDEX IF NOT EXISTS idx_field_num_trgm ON sh_alkis_parcel USING GIN (CAST
 
 -- GEOMETRY INDEX
 CREATE INDEX IF NOT EXISTS idx_sh_alkis_parcel_geometry ON sh_alkis_parcel USING GIST (wkb_geometry);
+
+
+-- IMPORTPROTOKOLL ALKIS DATEIEN
+DROP TABLE IF EXISTS sh_alkis_import_log;
+
+CREATE TABLE IF NOT EXISTS sh_alkis_import_log (
+  path TEXT PRIMARY KEY,
+  sha256 BYTEA NOT NULL,
+  imported_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  parcel_count INT NOT NULL
+);
@@ -1,24 +1,39 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import json
+import os
+import random
 import sys
-import time
 import traceback
 import logging as log
 
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Iterable, List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import click
 import httpx
-from fake_useragent import UserAgent
 
 
 DEFAULT_OUTPUT_DIR = Path('../data/sh/alkis')
+CHUNK_SIZE = 64 * 1024
+MAX_BACKOFF = 30.0
+CONNECT_RETRIES = 3
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
 USER_AGENT_FALLBACK = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 
+_UA_POOL = [
+    USER_AGENT_FALLBACK,
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0',
+]
+
 
 # log uncaught exceptions
 def log_exceptions(exc_type, value, tb):
@@ -44,25 +59,64 @@ def ensure_directory(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def save_download(download_path: Path, data: bytes) -> None:
-    ensure_directory(download_path)
+def build_partial_path(download_path: Path) -> Path:
+    return download_path.with_name(f'{download_path.name}.part')
+
+
+def build_meta_path(download_path: Path) -> Path:
+    return download_path.with_name(f'{download_path.name}.meta.json')
+
+
+def load_download_meta(download_path: Path) -> dict:
+    if not download_path.exists():
+        return {}
+
+    try:
+        with open(build_meta_path(download_path), 'r', encoding='utf-8') as file_handle:
+            return json.load(file_handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_conditional_headers(meta: dict) -> dict:
+    headers = {}
+
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
 
+    return headers
+
+
+def save_download(partial_path: Path, download_path: Path, response_headers: httpx.Headers) -> None:
     try:
-        with open(download_path, 'wb') as file_handle:
-            file_handle.write(data)
+        os.replace(partial_path, download_path)
     except PermissionError as error:
         log.error(error)
         return
 
     log.info('saved archive to %s', download_path)
 
+    meta = {
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+    }
+
+    if not any(meta.values()):
+        build_meta_path(download_path).unlink(missing_ok=True)
+        return
 
-def get_user_agent() -> str:
     try:
-        return UserAgent().random
-    except Exception as error:  # pragma: no cover - network/database errors from fake_useragent
-        log.debug('failed to create random user agent, using fallback: %s', error)
-        return USER_AGENT_FALLBACK
+        with open(build_meta_path(download_path), 'w', encoding='utf-8') as file_handle:
+            json.dump(meta, file_handle)
+    except OSError as error:
+        log.warning('failed to write download metadata for %s: %s', download_path, error)
+
+
+def get_user_agent() -> str:
+    return random.choice(_UA_POOL)
 
 
 def load_geojson(source: str) -> dict:
@@ -138,25 +192,110 @@ def build_download_path(properties: dict, output_dir: Path, link: Optional[str])
     return output_dir / filename
 
 
-def download_archive(url: str, client: httpx.Client, user_agent: str, retries: int = 3, backoff: float = 2.0) -> bytes:
-    headers = {'User-Agent': user_agent}
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    value = headers.get('Retry-After')
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt: int, backoff: float) -> float:
+    # full exponential growth with jitter so parallel downloads do not retry in lockstep
+    return min(backoff * 2 ** (attempt - 1), MAX_BACKOFF) * (0.5 + random.random())
+
+
+async def stream_to_file(response: httpx.Response, path: Path) -> None:
+    # file writes are blocking, keep them off the event loop
+    file_handle = await asyncio.to_thread(open, path, 'wb')
+
+    try:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            await asyncio.to_thread(file_handle.write, chunk)
+    finally:
+        await asyncio.to_thread(file_handle.close)
+
+
+async def download_archive(url: str, download_path: Path, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, conditional: bool = True, retries: int = 3, backoff: float = 2.0) -> None:
+    partial_path = build_partial_path(download_path)
     last_error: Optional[Exception] = None
+    headers = {}
+
+    await asyncio.to_thread(ensure_directory, download_path)
+
+    if conditional:
+        meta = await asyncio.to_thread(load_download_meta, download_path)
+        headers = build_conditional_headers(meta)
 
     for attempt in range(1, retries + 1):
         try:
-            response = client.get(url, headers=headers)
-            response.raise_for_status()
-            return response.content
+            async with semaphore:
+                async with client.stream('GET', url, headers=headers) as response:
+                    if response.status_code == httpx.codes.NOT_MODIFIED:
+                        log.info('archive %s not modified since last download', download_path)
+                        return
+
+                    response.raise_for_status()
+                    await stream_to_file(response, partial_path)
+
+            # only complete bodies replace the target, retries never leave a truncated archive behind
+            await asyncio.to_thread(save_download, partial_path, download_path, response.headers)
+            return
         except (httpx.HTTPStatusError, httpx.RequestError) as error:
             last_error = error
             log.warning('attempt %s/%s failed for %s: %s', attempt, retries, url, error)
 
+            status_error = isinstance(error, httpx.HTTPStatusError)
+
+            # client errors other than rate limiting will not go away by asking again
+            if status_error and error.response.status_code not in RETRY_STATUS_CODES:
+                break
+
             if attempt < retries:
-                time.sleep(backoff * attempt)
+                delay = parse_retry_after(error.response.headers) if status_error else None
+                await asyncio.sleep(delay if delay is not None else backoff_delay(attempt, backoff))
+
+    await asyncio.to_thread(partial_path.unlink, missing_ok=True)
 
     raise RuntimeError(f'failed to download {url}') from last_error
 
 
+async def fetch_archive(url: str, download_path: Path, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, conditional: bool) -> None:
+    try:
+        await download_archive(url, download_path, client, semaphore, conditional)
+    except Exception as error:
+        log.error('failed to download %s: %s', url, error)
+
+
+async def download_all(jobs: List[Tuple[str, Path]], user_agent: str, timeout: float, concurrency: int, conditional: bool) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency, keepalive_expiry=60.0)
+    headers = {'User-Agent': user_agent}
+
+    # connection failures are retried by the transport and do not use up download attempts
+    transport = httpx.AsyncHTTPTransport(verify=False, http2=True, limits=limits, retries=CONNECT_RETRIES)
+
+    # one pooled client per run so TCP and TLS sessions are reused across archives
+    async with httpx.AsyncClient(transport=transport, timeout=timeout, headers=headers) as client:
+        async with asyncio.TaskGroup() as group:
+            for link, download_path in jobs:
+                group.create_task(fetch_archive(link, download_path, client, semaphore, conditional))
+
+
 @click.command()
 @click.option('--debug', '-d', is_flag=True, help='Print debug output')
 @click.option('--verbose', '-v', is_flag=True, help='Print more verbose output')
@@ -167,7 +306,9 @@ def download_archive(url: str, client: httpx.Client, user_agent: str, retries: i
 @click.option('--dry-run', is_flag=True, help='Only print which files would be downloaded')
 @click.option('--skip-existing/--force', default=True, show_default=True, help='Skip downloads if the target file already exists')
 @click.option('--timeout', default=30.0, show_default=True, type=float, help='HTTP timeout in seconds')
-def main(geojson_source: str, output_path: Optional[Path], verbose: bool, debug: bool, start_index: int, end_index: Optional[int], dry_run: bool, skip_existing: bool, timeout: float):
+@click.option('--concurrency', '-c', default=8, show_default=True, type=click.IntRange(min=1), help='Number of parallel downloads')
+@click.option('--conditional/--no-conditional', default=True, show_default=True, help='Only re-download existing archives if the server copy changed (ETag / Last-Modified)')
+def main(geojson_source: str, output_path: Optional[Path], verbose: bool, debug: bool, start_index: int, end_index: Optional[int], dry_run: bool, skip_existing: bool, timeout: float, concurrency: int, conditional: bool):
     if debug:
         log.basicConfig(format='%(levelname)s: %(message)s', level=log.DEBUG)
     elif verbose:
@@ -192,32 +333,35 @@ def main(geojson_source: str, output_path: Optional[Path], verbose: bool, debug:
 
     log.info('downloading %s feature(s) to %s', len(selected_features), output_dir)
 
-    with httpx.Client(verify=False, timeout=timeout) as client:
-        for index, feature in enumerate(selected_features, start=start_index):
-            properties = feature.get('properties', {})
-            link = properties.get('link_data')
+    jobs: List[Tuple[str, Path]] = []
+
+    for index, feature in enumerate(selected_features, start=start_index):
+        properties = feature.get('properties', {})
+        link = properties.get('link_data')
 
-            if not link:
-                log.warning('feature #%s has no link_data property; skipping', index)
-                continue
+        if not link:
+            log.warning('feature #%s has no link_data property; skipping', index)
+            continue
 
-            download_path = build_download_path(properties, output_dir, link)
+        download_path = build_download_path(properties, output_dir, link)
 
-            if skip_existing and download_path.exists():
-                log.info('skipping existing file %s', download_path)
-                continue
+        if skip_existing and download_path.exists():
+            log.info('skipping existing file %s', download_path)
+            continue
 
-            if dry_run:
-                log.info('dry run: would download %s to %s', link, download_path)
-                continue
+        if dry_run:
+            log.info('dry run: would download %s to %s', link, download_path)
+            continue
+
+        jobs.append((link, download_path))
+
+    if not jobs:
+        return
 
-            try:
-                data = download_archive(link, client, user_agent)
-            except Exception as error:
-                log.error('failed to download %s: %s', link, error)
-                continue
+    # group requests per host so pooled connections are not evicted by interleaving
+    jobs.sort(key=lambda job: urlparse(job[0]).netloc)
 
-            save_download(download_path, data)
+    asyncio.run(download_all(jobs, user_agent, timeout, concurrency, conditional))
 
 
 if __name__ == '__main__':
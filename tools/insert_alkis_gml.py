@@ -5,37 +5,74 @@
 
 The script expects Schleswig-Holstein ALKIS extracts (``AX_Flurstueck`` features)
 stored as ``.xml`` or ``.xml.gz`` files. It reads each parcel, converts the raw
-GML geometry via ``ST_GeomFromGML`` and inserts the attributes into the
-``sh_alkis_parcel`` table that is shipped with this repository.
+GML geometry into EPSG:4326 WKB and inserts the attributes into the
+``sh_alkis_parcel`` table that is shipped with this repository. Pass ``--wkt``
+to send WKT text instead, which is handy when debugging geometry issues.
+
+Geometries are converted by OGR when the GDAL Python bindings (``osgeo``) are
+installed; they have to match the system GDAL and are therefore not pinned in
+``requirements.txt``. Without them the pure Python GML reader combined with
+pyproj and shapely is used; installing ``numba`` additionally compiles its
+coordinate parser to machine code. ``.gz`` files are decompressed with
+``isal`` (ISA-L) when it is installed and with the standard library otherwise.
 
 Usage example::
 
     python tools/insert_alkis_gml.py --env ../.env --input ../data/sh/alkis/01_2025
 
 The script keeps memory usage low by streaming the XML files with
-``xml.etree.ElementTree.iterparse`` and commits in configurable batches.
+``lxml.etree.iterparse``; a writer thread inserts parsed files while the next
+ones are parsed and commits between files every ``--commit-interval`` parcels.
 """
 
 from __future__ import annotations
 
+import hashlib
+import io
+import itertools
 import logging
 import os
+import queue
 import sys
 import traceback
 import typing as t
-import xml.etree.ElementTree as ET
 
-from dataclasses import dataclass
-from datetime import datetime
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
 
 import click
-import psycopg2
+import numpy as np
+import psycopg
+import pyproj
+import shapely
 from dotenv import load_dotenv
-from psycopg2.extensions import connection as PsycopgConnection
-from psycopg2.extensions import cursor as PsycopgCursor
-from psycopg2.extras import execute_values
-from psycopg2.sql import SQL, Identifier
+from lxml import etree
+from psycopg import Connection as PsycopgConnection
+from psycopg import Cursor as PsycopgCursor
+from psycopg.sql import SQL, Identifier
+from shapely.geometry import MultiPolygon, Polygon
+
+try:
+    from isal import isal_zlib as zlib
+except ImportError:  # pragma: no cover - isal is optional
+    import zlib
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is optional
+    njit = None
+
+try:
+    from osgeo import ogr, osr
+except ImportError:  # pragma: no cover - GDAL bindings are optional
+    ogr = None
+    osr = None
+else:
+    ogr.UseExceptions()
+    osr.UseExceptions()
 
 
 # Element namespaces used in NAS/GML files.
@@ -47,10 +84,152 @@ NS = {
 
 ADV_FLURSTUECK = f"{{{NS['adv']}}}AX_Flurstueck"
 
+GML_MULTISURFACE = f"{{{NS['gml']}}}MultiSurface"
+GML_SURFACE = f"{{{NS['gml']}}}Surface"
+GML_POLYGON = f"{{{NS['gml']}}}Polygon"
+GML_SURFACE_MEMBER = f"{{{NS['gml']}}}surfaceMember"
+GML_PATCHES = f"{{{NS['gml']}}}patches"
+GML_POLYGON_PATCH = f"{{{NS['gml']}}}PolygonPatch"
+GML_EXTERIOR = f"{{{NS['gml']}}}exterior"
+GML_INTERIOR = f"{{{NS['gml']}}}interior"
+GML_RING = f"{{{NS['gml']}}}Ring"
+GML_CURVE_MEMBER = f"{{{NS['gml']}}}curveMember"
+GML_CURVE = f"{{{NS['gml']}}}Curve"
+GML_SEGMENTS = f"{{{NS['gml']}}}segments"
+GML_POS_LIST = f"{{{NS['gml']}}}posList"
+GML_POS = f"{{{NS['gml']}}}pos"
+GML_COORDINATES = f"{{{NS['gml']}}}coordinates"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+# Server side conversion of the parcel geometry parameter, keyed by row field.
+GEOMETRY_SQL = {
+    "wkb_geometry": "ST_GeomFromWKB(%(wkb_geometry)s, 4326)",
+    "wkt_geometry": "ST_AsBinary(ST_Multi(ST_Transform(ST_GeomFromText(%(wkt_geometry)s, 25832), 4326)))",
+}
+
+# Postgres type of the geometry parameter, needed where the server cannot infer it.
+GEOMETRY_PARAM_TYPES = {"wkb_geometry": "bytea", "wkt_geometry": "text"}
+
+
+SOURCE_SUFFIXES = (".xml", ".xml.gz", ".nas", ".nas.gz")
+
+# zlib window bits selecting the gzip container, the magic bytes starting a member
+# and the size of compressed reads.
+GZIP_WBITS = 31
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_READ_SIZE = 1 << 16
+
+PARCEL_TABLE = "sh_alkis_parcel"
+
+# Digest of every source file that was imported completely, see data/sh_alkis_parcel_schema.sql.
+IMPORT_LOG_TABLE = "sh_alkis_import_log"
+
+# Batches are bulk loaded with binary COPY into these session-local tables and
+# moved into PARCEL_TABLE once per file. Parcels reference their geometry by
+# hash so identical geometries are only uploaded once per file.
+STAGE_TABLE = "sh_alkis_parcel_stage"
+GEOMETRY_STAGE_TABLE = "sh_alkis_geometry_stage"
+
+# Staging columns in COPY order with their Postgres type.
+STAGE_COLUMNS = (
+    ("adv_id", "varchar"),
+    ("start_time", "timestamptz"),
+    ("state_number", "varchar"),
+    ("administrative_district_number", "int4"),
+    ("county_number", "int4"),
+    ("municipality_number", "int4"),
+    ("cadastral_district_number", "int4"),
+    ("field_number_original", "varchar"),
+    ("denominator", "int4"),
+    ("numerator", "int4"),
+    ("different_legal_status", "bool"),
+    ("geom_hash", "bytea"),
+)
+
+GEOMETRY_STAGE_COLUMNS = (
+    ("geom_hash", "bytea"),
+    ("wkb_geometry", "bytea"),
+)
+
+GEOMETRY_HASH_SIZE = 16
+
+# Parsed files waiting for the database writer; bounds memory when parsing outpaces the inserts.
+PARSED_QUEUE_SIZE = 16
+
+# Memory granted to rebuilding the indexes dropped by --defer-indexes.
+INDEX_MAINTENANCE_WORK_MEM = "1GB"
+
+
+# Reprojects parsed coordinates client side so PostGIS only stores them.
+TRANSFORMER = pyproj.Transformer.from_crs(25832, 4326, always_xy=True)
+
+
+def create_ogr_transformation() -> t.Any:
+    if osr is None:
+        return None
+
+    source = osr.SpatialReference()
+    source.ImportFromEPSG(25832)
+    target = osr.SpatialReference()
+    target.ImportFromEPSG(4326)
+
+    # GDAL 3 would otherwise use the authority lat/lon axis order for EPSG:4326
+    for reference in (source, target):
+        reference.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    return osr.CoordinateTransformation(source, target)
+
+
+OGR_TRANSFORMATION = create_ogr_transformation()
+
+
+# (n, 2) float64 array of x/y positions and a polygon as (exterior, holes).
+Coords = np.ndarray
+PolygonRings = tuple[Coords, list[Coords]]
+
+
+def compile_xpath(path: str) -> etree.XPath:
+    return etree.XPath(path, namespaces=NS, smart_strings=False)
+
+
+# Parcel attribute lookups, compiled once instead of per parcel.
+XP_IDENTIFIER = compile_xpath("./gml:identifier/text()")
+XP_START_TIME = compile_xpath("./adv:lebenszeitintervall/adv:AA_Lebenszeitintervall/adv:beginnt/text()")
+XP_STATE = compile_xpath("./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:land/text()")
+XP_ADMINISTRATIVE_DISTRICT = compile_xpath(
+    "./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:regierungsbezirk/text()"
+)
+XP_COUNTY = compile_xpath("./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:kreis/text()")
+XP_MUNICIPALITY = compile_xpath("./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:gemeinde/text()")
+XP_CADASTRAL_DISTRICT = compile_xpath("./adv:gemarkung/adv:AX_Gemarkung_Schluessel/adv:gemarkungsnummer/text()")
+XP_FIELD_NUMBER = compile_xpath("./adv:flurnummer/text()")
+XP_DENOMINATOR = compile_xpath("./adv:flurstuecksnummer/adv:AX_Flurstuecksnummer/adv:nenner/text()")
+XP_NUMERATOR = compile_xpath("./adv:flurstuecksnummer/adv:AX_Flurstuecksnummer/adv:zaehler/text()")
+XP_DIFFERENT_LEGAL_STATUS = compile_xpath("./adv:abweichenderRechtszustand/text()")
+
+# Geometry lookups in order of preference.
+XP_GEOMETRIES = (
+    compile_xpath("descendant::gml:MultiSurface[1]"),
+    compile_xpath("descendant::gml:Surface[1]"),
+    compile_xpath("descendant::gml:Polygon[1]"),
+)
+
+
+@dataclass
+class ParsedFile:
+    path: Path
+    rows: list[dict[str, t.Any]] = field(default_factory=list)
+    parcels_seen: int = 0
+    parcels_skipped: int = 0
+    sha256: t.Optional[bytes] = None
+    unchanged: bool = False
+
 
 @dataclass
 class ImportStats:
     files_seen: int = 0
+    files_unchanged: int = 0
     parcels_seen: int = 0
     parcels_inserted: int = 0
     parcels_skipped: int = 0
@@ -80,8 +259,8 @@ def load_env(env_path: Path) -> PsycopgConnection:
 
     load_dotenv(dotenv_path=env_path)
 
-    conn = psycopg2.connect(
-        database=os.getenv("DB_NAME"),
+    conn = psycopg.connect(
+        dbname=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASS"),
         host=os.getenv("DB_HOST"),
@@ -93,43 +272,101 @@ def load_env(env_path: Path) -> PsycopgConnection:
     return conn
 
 
-def iter_flurstuecke(path: Path) -> t.Iterator[ET.Element]:
+class GzipMemberReader(io.RawIOBase):
+    """Decompress a gzip file member by member, ignoring trailing bytes.
+
+    Schleswig-Holstein files contain an extra newline after the compressed
+    stream. ``gzip.open`` raises on it during the read that returns the last
+    decompressed data, so the end of the document was lost. Bytes after a
+    member that do not start a new one are dropped here instead.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._raw = open(path, "rb")
+        self._decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+        self._input = b""
+        self._finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: t.Any) -> int:
+        while not self._finished:
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                if len(data) < len(GZIP_MAGIC):
+                    data += self._raw.read(GZIP_READ_SIZE)
+
+                if not data.startswith(GZIP_MAGIC):
+                    self._finished = True
+                    break
+
+                self._decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+                self._input = data
+
+            if not self._input:
+                self._input = self._raw.read(GZIP_READ_SIZE)
+                if not self._input:
+                    raise EOFError("compressed file ended before the end-of-stream marker was reached")
+
+            chunk = self._decompressor.decompress(self._input, len(buffer))
+            self._input = self._decompressor.unconsumed_tail
+
+            if chunk:
+                buffer[: len(chunk)] = chunk
+                return len(chunk)
+
+        return 0
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+
+def iter_flurstuecke(path: Path) -> t.Iterator[etree._Element]:
     """Yield ``AX_Flurstueck`` elements from an ALKIS NAS/GML file."""
 
-    opener: t.Callable[..., t.Iterator[bytes]]
+    opener: t.Callable[..., t.BinaryIO]
 
     if path.suffix == ".gz":
-        import gzip
-
-        opener = lambda p: gzip.open(p, "rb")  # noqa: E731 - small helper
+        opener = lambda p: io.BufferedReader(GzipMemberReader(p), GZIP_READ_SIZE)  # noqa: E731 - small helper
     else:
         opener = lambda p: open(p, "rb")  # noqa: E731 - small helper
 
     logging.debug("parsing file %s", path)
 
-    with opener(path) as fh:  # type: ignore[arg-type]
-        try:
-            for event, elem in ET.iterparse(fh, events=("end",)):
-                if elem.tag == ADV_FLURSTUECK:
-                    yield elem
-                    elem.clear()
-        except OSError as error:
-            # Schleswig-Holstein files contain an extra newline after the
-            # compressed stream; ``gzip`` raises ``Not a gzipped file`` at EOF.
-            if "Not a gzipped file" in str(error):
-                logging.debug("ignoring gzip trailer issue for %s", path)
-            else:
-                raise
-
-
-def find_text(element: ET.Element, path: str) -> t.Optional[str]:
-    node = element.find(path, NS)
-    if node is None or node.text is None:
+    with opener(path) as fh:
+        # libxml2 only hands back AX_Flurstueck elements; everything else
+        # is parsed in C without building Python objects.
+        for _, elem in etree.iterparse(
+            fh, events=("end",), tag=ADV_FLURSTUECK, huge_tree=True, recover=True
+        ):
+            yield elem
+
+            # drop the parsed parcel and its already processed siblings so
+            # the tree does not grow with the file
+            elem.clear(keep_tail=True)
+            for ancestor in itertools.chain((elem,), elem.iterancestors()):
+                while ancestor.getprevious() is not None:
+                    del ancestor.getparent()[0]
+
+
+def find_text(element: etree._Element, xpath: etree.XPath) -> t.Optional[str]:
+    result = xpath(element)
+    if not result:
         return None
-    value = node.text.strip()
+    value = result[0].strip()
     return value or None
 
 
+def find_geometry(element: etree._Element) -> t.Optional[etree._Element]:
+    for xpath in XP_GEOMETRIES:
+        result = xpath(element)
+        if result:
+            return result[0]
+    return None
+
+
 def parse_int(value: t.Optional[str]) -> t.Optional[int]:
     if value is None:
         return None
@@ -158,62 +395,162 @@ def parse_datetime(value: t.Optional[str]) -> t.Optional[datetime]:
     try:
         if value.endswith("Z"):
             value = value[:-1] + "+00:00"
-        return datetime.fromisoformat(value)
+        parsed = datetime.fromisoformat(value)
     except ValueError:
         logging.debug("failed to parse datetime: %s", value)
-    return None
+        return None
+    # ALKIS timestamps are UTC, values without an offset are read as UTC as well
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+POW10 = np.array([10.0**exponent for exponent in range(23)])
+MAX_EXACT_MANTISSA = 2**53
+
+
+def scan_numbers(buffer: np.ndarray, pow10: np.ndarray) -> tuple[np.ndarray, bool]:
+    """Parse whitespace separated ASCII decimals from a ``uint8`` buffer.
+
+    Meant to be compiled with numba. Values are computed as an integer
+    mantissa scaled by an exact power of ten, which is correctly rounded as
+    long as the mantissa fits into 53 bits and the scale stays within 22.
+    Anything else returns ``ok = False`` so the caller can fall back to the
+    regular float parser.
+    """
+
+    values = np.empty(buffer.size // 2 + 1, dtype=np.float64)
+    count = 0
+    i = 0
+    n = buffer.size
+    while i < n:
+        c = buffer[i]
+        if c == 32 or c == 9 or c == 10 or c == 13:
+            i += 1
+            continue
+        negative = False
+        if c == 45 or c == 43:
+            negative = c == 45
+            i += 1
+        mantissa = 0
+        scale = 0
+        digits = 0
+        while i < n and 48 <= buffer[i] <= 57:
+            mantissa = mantissa * 10 + (buffer[i] - 48)
+            digits += 1
+            i += 1
+            if mantissa > MAX_EXACT_MANTISSA:
+                return values[:0], False
+        if i < n and buffer[i] == 46:
+            i += 1
+            while i < n and 48 <= buffer[i] <= 57:
+                mantissa = mantissa * 10 + (buffer[i] - 48)
+                scale -= 1
+                digits += 1
+                i += 1
+                if mantissa > MAX_EXACT_MANTISSA:
+                    return values[:0], False
+        if digits == 0:
+            return values[:0], False
+        if i < n and (buffer[i] == 101 or buffer[i] == 69):
+            i += 1
+            exp_negative = False
+            if i < n and (buffer[i] == 45 or buffer[i] == 43):
+                exp_negative = buffer[i] == 45
+                i += 1
+            exponent = 0
+            exp_digits = 0
+            while i < n and 48 <= buffer[i] <= 57:
+                exponent = exponent * 10 + (buffer[i] - 48)
+                exp_digits += 1
+                i += 1
+                if exponent > 1000:
+                    return values[:0], False
+            if exp_digits == 0:
+                return values[:0], False
+            scale += -exponent if exp_negative else exponent
+        if i < n and not (buffer[i] == 32 or buffer[i] == 9 or buffer[i] == 10 or buffer[i] == 13):
+            return values[:0], False
+        if scale < -22 or scale > 22:
+            return values[:0], False
+        value = float(mantissa)
+        if scale < 0:
+            value = value / pow10[-scale]
+        else:
+            value = value * pow10[scale]
+        values[count] = -value if negative else value
+        count += 1
+    return values[:count], True
+
+
+COMPILED_SCAN_NUMBERS = njit(cache=True, nogil=True)(scan_numbers) if njit is not None else None
+
+
+def parse_numbers(text: str) -> np.ndarray:
+    """Parse a coordinate string into a flat float64 array; raises ``ValueError``."""
+
+    if COMPILED_SCAN_NUMBERS is not None:
+        values, ok = COMPILED_SCAN_NUMBERS(np.frombuffer(text.encode("utf-8"), dtype=np.uint8), POW10)
+        if ok:
+            return values
 
+    return np.array(text.split(), dtype=np.float64)
 
-def parse_poslist(text: str, dimension: t.Optional[int]) -> list[tuple[float, float]]:
+
+def empty_coords() -> Coords:
+    return np.empty((0, 2), dtype=np.float64)
+
+
+def parse_poslist(text: str, dimension: t.Optional[int]) -> Coords:
     try:
-        raw = [float(item) for item in text.split()]
+        raw = parse_numbers(text)
     except ValueError:
         logging.debug("failed to parse posList: %s", text[:64])
-        return []
+        return empty_coords()
 
     dim = dimension or 2
 
     if dim < 2:
         dim = 2
 
-    if len(raw) % dim != 0:
-        logging.debug("unexpected coordinate count %s for dimension %s", len(raw), dim)
-        return []
+    if raw.size % dim != 0:
+        logging.debug("unexpected coordinate count %s for dimension %s", raw.size, dim)
+        return empty_coords()
 
-    coords: list[tuple[float, float]] = []
+    return raw.reshape(-1, dim)[:, :2]
 
-    for index in range(0, len(raw), dim):
-        coords.append((raw[index], raw[index + 1]))
 
-    return coords
+def first_child(element: etree._Element, tag: str) -> t.Optional[etree._Element]:
+    return next(element.iterchildren(tag), None)
 
 
-def parse_segment(segment: ET.Element) -> list[tuple[float, float]]:
-    pos_list = segment.find("gml:posList", NS)
+def parse_segment(segment: etree._Element) -> Coords:
+    pos_list = first_child(segment, GML_POS_LIST)
 
     if pos_list is not None and pos_list.text:
         dimension = pos_list.get("srsDimension") or segment.get("srsDimension")
         return parse_poslist(pos_list.text, int(dimension) if dimension else None)
 
-    positions = [pos.text for pos in segment.findall("gml:pos", NS) if pos.text]
+    positions = [pos.text for pos in segment.iterchildren(GML_POS) if pos.text]
 
     if positions:
-        coords: list[tuple[float, float]] = []
-        for pos in positions:
-            coords.extend(parse_poslist(pos, None))
-        return coords
+        return np.concatenate([parse_poslist(pos, None) for pos in positions])
+
+    coordinates = first_child(segment, GML_COORDINATES)
+    if coordinates is not None and coordinates.text:
+        return parse_poslist(coordinates.text.replace(",", " "), None)
+
+    return empty_coords()
 
-    coords_text = segment.findtext("gml:coordinates", default=None, namespaces=NS)
-    if coords_text:
-        return parse_poslist(coords_text.replace(",", " "), None)
 
-    return []
+def append_curve_points(current: list[Coords], curve: etree._Element) -> list[Coords]:
+    """Append the segment coordinates of ``curve`` to the ring parts in ``current``.
 
+    Parts are only concatenated once per ring in ``ring_coordinates``;
+    a segment that starts where the previous one ended drops its first point.
+    """
 
-def append_curve_points(
-    current: list[tuple[float, float]], curve: ET.Element
-) -> list[tuple[float, float]]:
-    segments = curve.find("gml:segments", NS)
+    segments = first_child(curve, GML_SEGMENTS)
 
     if segments is None:
         return current
@@ -221,72 +558,77 @@ def append_curve_points(
     for segment in segments:
         points = parse_segment(segment)
 
-        if not points:
+        if not len(points):
             continue
 
-        if current:
-            if current[-1] == points[0]:
-                current.extend(points[1:])
-            else:
-                current.extend(points)
+        if current and np.array_equal(current[-1][-1], points[0]):
+            current.append(points[1:])
         else:
-            current.extend(points)
+            current.append(points)
 
     return current
 
 
-def ring_coordinates(ring: ET.Element) -> list[tuple[float, float]]:
-    coords: list[tuple[float, float]] = []
+def ring_coordinates(ring: etree._Element) -> Coords:
+    parts: list[Coords] = []
 
-    for curve_member in ring.findall("gml:curveMember", NS):
-        curve = curve_member.find("gml:Curve", NS)
+    for curve_member in ring.iterchildren(GML_CURVE_MEMBER):
+        curve = first_child(curve_member, GML_CURVE)
         if curve is None:
-            href = curve_member.get("{http://www.w3.org/1999/xlink}href")
+            href = curve_member.get(XLINK_HREF)
             if href:
                 logging.debug("curve references via xlink are not supported: %s", href)
             continue
-        coords = append_curve_points(coords, curve)
+        parts = append_curve_points(parts, curve)
+
+    if not parts:
+        logging.debug("ring has insufficient points (0)")
+        return empty_coords()
 
-    if coords and coords[0] != coords[-1]:
-        coords.append(coords[0])
+    coords = np.concatenate(parts)
+
+    if not np.array_equal(coords[0], coords[-1]):
+        coords = np.vstack((coords, coords[:1]))
 
     if len(coords) < 4:
         logging.debug("ring has insufficient points (%s)", len(coords))
-        return []
+        return empty_coords()
 
     return coords
 
 
-def polygon_patch_to_rings(patch: ET.Element) -> t.Optional[tuple[list[tuple[float, float]], list[list[tuple[float, float]]]]]:
-    exterior_ring = patch.find("gml:exterior/gml:Ring", NS)
+def polygon_patch_to_rings(patch: etree._Element) -> t.Optional[PolygonRings]:
+    exterior_boundary = first_child(patch, GML_EXTERIOR)
+    exterior_ring = first_child(exterior_boundary, GML_RING) if exterior_boundary is not None else None
 
     if exterior_ring is None:
         return None
 
     exterior = ring_coordinates(exterior_ring)
 
-    if not exterior:
+    if not len(exterior):
         return None
 
-    interiors: list[list[tuple[float, float]]] = []
+    interiors: list[Coords] = []
 
-    for interior_ring in patch.findall("gml:interior/gml:Ring", NS):
-        ring = ring_coordinates(interior_ring)
-        if ring:
-            interiors.append(ring)
+    for interior_boundary in patch.iterchildren(GML_INTERIOR):
+        for interior_ring in interior_boundary.iterchildren(GML_RING):
+            ring = ring_coordinates(interior_ring)
+            if len(ring):
+                interiors.append(ring)
 
     return exterior, interiors
 
 
-def surface_to_polygons(surface: ET.Element) -> list[tuple[list[tuple[float, float]], list[list[tuple[float, float]]]]]:
-    patches = surface.find("gml:patches", NS)
+def surface_to_polygons(surface: etree._Element) -> list[PolygonRings]:
+    patches = first_child(surface, GML_PATCHES)
 
     if patches is None:
         return []
 
-    polygons: list[tuple[list[tuple[float, float]], list[list[tuple[float, float]]]]] = []
+    polygons: list[PolygonRings] = []
 
-    for patch in patches.findall("gml:PolygonPatch", NS):
+    for patch in patches.iterchildren(GML_POLYGON_PATCH):
         rings = polygon_patch_to_rings(patch)
         if rings:
             polygons.append(rings)
@@ -294,41 +636,46 @@ def surface_to_polygons(surface: ET.Element) -> list[tuple[list[tuple[float, flo
     return polygons
 
 
-def geometry_to_polygons(geometry: ET.Element) -> list[tuple[list[tuple[float, float]], list[list[tuple[float, float]]]]]:
-    polygons: list[tuple[list[tuple[float, float]], list[list[tuple[float, float]]]]] = []
+def multisurface_to_polygons(geometry: etree._Element) -> list[PolygonRings]:
+    polygons: list[PolygonRings] = []
 
-    if geometry.tag == "{http://www.opengis.net/gml/3.2}MultiSurface":
-        for member in geometry.findall("gml:surfaceMember", NS):
-            surface = member.find("gml:Surface", NS)
-            if surface is not None:
-                polygons.extend(surface_to_polygons(surface))
-    elif geometry.tag == "{http://www.opengis.net/gml/3.2}Surface":
-        polygons.extend(surface_to_polygons(geometry))
-    elif geometry.tag == "{http://www.opengis.net/gml/3.2}Polygon":
-        rings = polygon_patch_to_rings(geometry)
-        if rings:
-            polygons.append(rings)
+    for member in geometry.iterchildren(GML_SURFACE_MEMBER):
+        surface = first_child(member, GML_SURFACE)
+        if surface is not None:
+            polygons.extend(surface_to_polygons(surface))
 
     return polygons
 
 
-def ring_to_wkt(ring: list[tuple[float, float]]) -> str:
-    return ", ".join(f"{x} {y}" for x, y in ring)
+def polygon_to_polygons(geometry: etree._Element) -> list[PolygonRings]:
+    rings = polygon_patch_to_rings(geometry)
+    return [rings] if rings else []
+
+
+GEOMETRY_HANDLERS: dict[str, t.Callable[[etree._Element], list[PolygonRings]]] = {
+    GML_MULTISURFACE: multisurface_to_polygons,
+    GML_SURFACE: surface_to_polygons,
+    GML_POLYGON: polygon_to_polygons,
+}
+
+
+def geometry_to_polygons(geometry: etree._Element) -> list[PolygonRings]:
+    handler = GEOMETRY_HANDLERS.get(geometry.tag)
+    return handler(geometry) if handler else []
+
 
+def ring_to_wkt(ring: Coords) -> str:
+    return ", ".join(f"{x} {y}" for x, y in ring.tolist())
 
-def polygon_to_wkt(
-    exterior: list[tuple[float, float]],
-    holes: list[list[tuple[float, float]]],
-) -> str:
+
+def polygon_to_wkt(exterior: Coords, holes: list[Coords]) -> str:
     rings = [f"({ring_to_wkt(exterior)})"]
     for hole in holes:
         rings.append(f"({ring_to_wkt(hole)})")
     return ", ".join(rings)
 
 
-def polygons_to_wkt(
-    polygons: list[tuple[list[tuple[float, float]], list[list[tuple[float, float]]]]]
-) -> t.Optional[str]:
+def polygons_to_wkt(polygons: list[PolygonRings]) -> t.Optional[str]:
     if not polygons:
         return None
 
@@ -344,63 +691,81 @@ def polygons_to_wkt(
     return f"MULTIPOLYGON({joined})"
 
 
-def extract_parcel(element: ET.Element) -> t.Optional[dict[str, t.Any]]:
-    """Convert an ``AX_Flurstueck`` XML element into a dict for SQL inserts."""
+def transform_coords(coords: Coords) -> Coords:
+    lon, lat = TRANSFORMER.transform(coords[:, 0], coords[:, 1])
+    return np.column_stack((lon, lat))
+
+
+def gml_to_wkb(geometry_node: etree._Element) -> t.Optional[bytes]:
+    """Convert a GML geometry with OGR and return it as EPSG:4326 multipolygon WKB."""
+
+    try:
+        geometry = ogr.CreateGeometryFromGML(etree.tostring(geometry_node, encoding="unicode", with_tail=False))
+        geometry = ogr.ForceToMultiPolygon(geometry.GetLinearGeometry())
+
+        if geometry.IsEmpty():
+            return None
+
+        geometry.Transform(OGR_TRANSFORMATION)
+        # the posList fallback keeps x and y only, the column takes no Z values
+        geometry.FlattenTo2D()
+    except RuntimeError as error:
+        logging.debug("OGR failed to convert geometry: %s", error)
+        return None
 
-    adv_id = find_text(element, "./gml:identifier")
-    geometry_node = element.find(".//gml:MultiSurface", NS)
+    return bytes(geometry.ExportToIsoWkb())
 
-    if geometry_node is None:
-        geometry_node = element.find(".//gml:Surface", NS)
 
-    if geometry_node is None:
-        geometry_node = element.find(".//gml:Polygon", NS)
+def polygons_to_wkb(polygons: list[PolygonRings]) -> t.Optional[bytes]:
+    """Return the parcel as EPSG:4326 multipolygon WKB."""
+
+    if not polygons:
+        return None
+
+    geometry = MultiPolygon([Polygon(exterior, holes) for exterior, holes in polygons])
 
-    geometry_wkt: t.Optional[str] = None
+    # all vertices of the parcel are reprojected in a single call
+    return shapely.to_wkb(shapely.transform(geometry, transform_coords))
 
-    if geometry_node is not None:
-        polygons = geometry_to_polygons(geometry_node)
-        geometry_wkt = polygons_to_wkt(polygons)
 
-    if geometry_wkt is None:
+def convert_geometry(geometry_node: etree._Element, use_wkt: bool) -> t.Union[bytes, str, None]:
+    if use_wkt:
+        return polygons_to_wkt(geometry_to_polygons(geometry_node))
+
+    if ogr is not None:
+        return gml_to_wkb(geometry_node)
+
+    return polygons_to_wkb(geometry_to_polygons(geometry_node))
+
+
+def extract_parcel(element: etree._Element, use_wkt: bool = False) -> t.Optional[dict[str, t.Any]]:
+    """Convert an ``AX_Flurstueck`` XML element into a dict for SQL inserts.
+
+    The geometry is stored as ``wkb_geometry`` (EPSG:4326 bytes) or, with
+    ``use_wkt``, as ``wkt_geometry`` (EPSG:25832 text) which PostGIS transforms.
+    """
+
+    adv_id = find_text(element, XP_IDENTIFIER)
+    geometry_node = find_geometry(element)
+    geometry = convert_geometry(geometry_node, use_wkt) if geometry_node is not None else None
+
+    if geometry is None:
         logging.debug("skipping parcel %s without supported geometry", adv_id)
         return None
 
     data = {
         "adv_id": adv_id,
-        "start_time": parse_datetime(
-            find_text(element, "./adv:lebenszeitintervall/adv:AA_Lebenszeitintervall/adv:beginnt")
-        ),
-        "state_number": find_text(
-            element, "./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:land"
-        ),
-        "administrative_district_number": parse_int(
-            find_text(element, "./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:regierungsbezirk")
-        ),
-        "county_number": parse_int(
-            find_text(element, "./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:kreis")
-        ),
-        "municipality_number": parse_int(
-            find_text(element, "./adv:gemeindezugehoerigkeit/adv:AX_Gemeindekennzeichen/adv:gemeinde")
-        ),
-        "cadastral_district_number": parse_int(
-            find_text(element, "./adv:gemarkung/adv:AX_Gemarkung_Schluessel/adv:gemarkungsnummer")
-        ),
-        "field_number_original": find_text(element, "./adv:flurnummer"),
-        "denominator": parse_int(
-            find_text(
-                element,
-                "./adv:flurstuecksnummer/adv:AX_Flurstuecksnummer/adv:nenner",
-            )
-        ),
-        "numerator": parse_int(
-            find_text(
-                element,
-                "./adv:flurstuecksnummer/adv:AX_Flurstuecksnummer/adv:zaehler",
-            )
-        ),
-        "different_legal_status": parse_bool(find_text(element, "./adv:abweichenderRechtszustand")),
-        "wkt_geometry": geometry_wkt,
+        "start_time": parse_datetime(find_text(element, XP_START_TIME)),
+        "state_number": find_text(element, XP_STATE),
+        "administrative_district_number": parse_int(find_text(element, XP_ADMINISTRATIVE_DISTRICT)),
+        "county_number": parse_int(find_text(element, XP_COUNTY)),
+        "municipality_number": parse_int(find_text(element, XP_MUNICIPALITY)),
+        "cadastral_district_number": parse_int(find_text(element, XP_CADASTRAL_DISTRICT)),
+        "field_number_original": find_text(element, XP_FIELD_NUMBER),
+        "denominator": parse_int(find_text(element, XP_DENOMINATOR)),
+        "numerator": parse_int(find_text(element, XP_NUMERATOR)),
+        "different_legal_status": parse_bool(find_text(element, XP_DIFFERENT_LEGAL_STATUS)),
+        "wkt_geometry" if use_wkt else "wkb_geometry": geometry,
     }
 
     if data["adv_id"] is None:
@@ -414,7 +779,12 @@ def extract_parcel(element: ET.Element) -> t.Optional[dict[str, t.Any]]:
     return data
 
 
+def geometry_key(row: dict[str, t.Any]) -> str:
+    return "wkt_geometry" if "wkt_geometry" in row else "wkb_geometry"
+
+
 def insert_parcel(cursor: PsycopgCursor, data: dict[str, t.Any]) -> None:
+    key = geometry_key(data)
     sql = SQL(
         """
         INSERT INTO {table} (
@@ -428,24 +798,113 @@ def insert_parcel(cursor: PsycopgCursor, data: dict[str, t.Any]) -> None:
             %(administrative_district_number)s, %(county_number)s, %(municipality_number)s,
             %(cadastral_district_number)s, %(field_number_original)s, %(denominator)s,
             %(numerator)s, %(different_legal_status)s,
-            CASE WHEN %(wkt_geometry)s IS NULL THEN NULL
-                 ELSE ST_AsBinary(
-                    ST_Multi(
-                        ST_Transform(ST_GeomFromText(%(wkt_geometry)s, 25832), 4326)
-                    )
-                 )
+            CASE WHEN %({key})s::{param_type} IS NULL THEN NULL
+                 ELSE {geometry}
             END
         )
         """
-    ).format(table=Identifier("sh_alkis_parcel"))
+    ).format(
+        table=Identifier(PARCEL_TABLE),
+        key=SQL(key),
+        param_type=SQL(GEOMETRY_PARAM_TYPES[key]),
+        geometry=SQL(GEOMETRY_SQL[key]),
+    )
 
     cursor.execute(sql, data)
 
 
-def insert_batch(cursor: PsycopgCursor, rows: list[dict[str, t.Any]]) -> None:
+def create_stage_tables(cursor: PsycopgCursor) -> None:
+    """Create the session-local staging tables that COPY batches are loaded into.
+
+    Temporary tables are never WAL-logged, so filling the stage costs no more
+    than an ``UNLOGGED`` table while staying private to this connection.
+    """
+
+    for table, columns in ((STAGE_TABLE, STAGE_COLUMNS), (GEOMETRY_STAGE_TABLE, GEOMETRY_STAGE_COLUMNS)):
+        cursor.execute(
+            SQL("CREATE TEMP TABLE IF NOT EXISTS {stage} ({columns})").format(
+                stage=Identifier(table),
+                columns=SQL(", ").join(SQL("{} {}").format(Identifier(name), SQL(pg_type)) for name, pg_type in columns),
+            )
+        )
+
+
+def copy_rows(
+    cursor: PsycopgCursor,
+    table: str,
+    columns: tuple[tuple[str, str], ...],
+    rows: t.Iterable[dict[str, t.Any]],
+) -> None:
+    names = [name for name, _ in columns]
+    statement = SQL("COPY {stage} ({columns}) FROM STDIN WITH (FORMAT BINARY)").format(
+        stage=Identifier(table), columns=SQL(", ").join(map(Identifier, names))
+    )
+
+    with cursor.copy(statement) as copy:
+        copy.set_types([pg_type for _, pg_type in columns])
+        for row in rows:
+            copy.write_row([row[name] for name in names])
+
+
+def insert_batch(cursor: PsycopgCursor, rows: list[dict[str, t.Any]], staged_hashes: set[bytes]) -> None:
+    """Bulk load WKB rows into the binary COPY staging tables.
+
+    Geometries whose hash is already in ``staged_hashes`` are not sent again;
+    the set is only extended once both COPY commands succeeded.
+    """
+
     if not rows:
         return
 
+    if geometry_key(rows[0]) == "wkt_geometry":
+        insert_batch_values(cursor, rows)
+        return
+
+    geometries: dict[bytes, dict[str, t.Any]] = {}
+
+    for row in rows:
+        geom_hash = row["geom_hash"]
+        if geom_hash is not None and geom_hash not in staged_hashes:
+            geometries.setdefault(geom_hash, row)
+
+    copy_rows(cursor, GEOMETRY_STAGE_TABLE, GEOMETRY_STAGE_COLUMNS, geometries.values())
+    copy_rows(cursor, STAGE_TABLE, STAGE_COLUMNS, rows)
+
+    staged_hashes.update(geometries)
+
+
+def move_stage_rows(cursor: PsycopgCursor) -> None:
+    """Move every staged row into ``sh_alkis_parcel`` and empty the stage."""
+
+    names = [name for name, _ in STAGE_COLUMNS[:-1]]
+
+    cursor.execute(
+        SQL(
+            """
+            INSERT INTO {table} ({attributes}, wkb_geometry)
+            SELECT {staged}, ST_GeomFromWKB(g.wkb_geometry, 4326)
+            FROM {stage} AS p
+            LEFT JOIN {geometry_stage} AS g ON g.geom_hash = p.geom_hash
+            """
+        ).format(
+            table=Identifier(PARCEL_TABLE),
+            stage=Identifier(STAGE_TABLE),
+            geometry_stage=Identifier(GEOMETRY_STAGE_TABLE),
+            attributes=SQL(", ").join(map(Identifier, names)),
+            staged=SQL(", ").join(Identifier("p", name) for name in names),
+        )
+    )
+
+    cursor.execute(
+        SQL("TRUNCATE {stage}, {geometry_stage}").format(
+            stage=Identifier(STAGE_TABLE), geometry_stage=Identifier(GEOMETRY_STAGE_TABLE)
+        )
+    )
+
+
+def insert_batch_values(cursor: PsycopgCursor, rows: list[dict[str, t.Any]]) -> None:
+    """Insert rows one statement each in pipeline mode, used for ``--wkt`` rows."""
+
     sql = SQL(
         """
         INSERT INTO {table} (
@@ -453,34 +912,106 @@ def insert_batch(cursor: PsycopgCursor, rows: list[dict[str, t.Any]]) -> None:
             administrative_district_number, county_number, municipality_number,
             cadastral_district_number, field_number_original, denominator, numerator,
             different_legal_status, wkb_geometry
-        ) VALUES %s
+        ) VALUES (
+            %(adv_id)s, %(start_time)s, %(state_number)s, %(administrative_district_number)s,
+            %(county_number)s, %(municipality_number)s, %(cadastral_district_number)s,
+            %(field_number_original)s, %(denominator)s, %(numerator)s, %(different_legal_status)s,
+            {geometry}
+        )
+        """
+    ).format(table=Identifier(PARCEL_TABLE), geometry=SQL(GEOMETRY_SQL[geometry_key(rows[0])]))
+
+    # the pipeline sends all rows before waiting for the server's replies
+    with cursor.connection.pipeline():
+        cursor.executemany(sql, rows)
+
+
+def drop_indexes(cursor: PsycopgCursor) -> list[tuple[str, str]]:
+    """Drop the secondary indexes of ``sh_alkis_parcel`` and return their definitions.
+
+    Indexes backing a constraint (the primary key) are kept.
+    """
+
+    cursor.execute(
         """
-    ).format(table=Identifier("sh_alkis_parcel"))
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        ORDER BY c.relname
+        """,
+        (PARCEL_TABLE,),
+    )
+    definitions = cursor.fetchall()
+
+    for name, _ in definitions:
+        logging.info("dropping index %s until the import is done", name)
+        cursor.execute(SQL("DROP INDEX {index}").format(index=Identifier(name)))
+
+    return definitions
+
+
+def import_log_key(path: Path) -> str:
+    return str(path.resolve())
 
-    template = (
-        "(%(adv_id)s, %(start_time)s, %(state_number)s, %(administrative_district_number)s,"
-        " %(county_number)s, %(municipality_number)s, %(cadastral_district_number)s,"
-        " %(field_number_original)s, %(denominator)s, %(numerator)s, %(different_legal_status)s,"
-        " ST_AsBinary(ST_Multi(ST_Transform(ST_GeomFromText(%(wkt_geometry)s, 25832), 4326))))"
+
+def load_import_log(cursor: PsycopgCursor) -> t.Optional[dict[str, bytes]]:
+    """Return the source file digests of earlier imports, ``None`` without a log table."""
+
+    cursor.execute("SELECT to_regclass(%s)", (IMPORT_LOG_TABLE,))
+
+    if cursor.fetchone()[0] is None:
+        logging.warning("table %s not found, imported files are not tracked", IMPORT_LOG_TABLE)
+        return None
+
+    cursor.execute(SQL("SELECT path, sha256 FROM {log}").format(log=Identifier(IMPORT_LOG_TABLE)))
+    return {path: bytes(digest) for path, digest in cursor.fetchall()}
+
+
+def record_import(cursor: PsycopgCursor, parsed: ParsedFile, parcel_count: int) -> None:
+    cursor.execute(
+        SQL(
+            """
+            INSERT INTO {log} (path, sha256, imported_at, parcel_count)
+            VALUES (%s, %s, now(), %s)
+            ON CONFLICT (path) DO UPDATE
+            SET sha256 = EXCLUDED.sha256, imported_at = EXCLUDED.imported_at, parcel_count = EXCLUDED.parcel_count
+            """
+        ).format(log=Identifier(IMPORT_LOG_TABLE)),
+        (import_log_key(parsed.path), parsed.sha256, parcel_count),
     )
 
-    execute_values(cursor, sql.as_string(cursor), rows, template=template)
+
+def create_indexes(cursor: PsycopgCursor, definitions: list[tuple[str, str]]) -> None:
+    """Recreate indexes removed by :func:`drop_indexes` in a single transaction."""
+
+    cursor.execute("SELECT set_config('maintenance_work_mem', %s, true)", (INDEX_MAINTENANCE_WORK_MEM,))
+
+    for name, definition in definitions:
+        logging.info("creating index %s", name)
+        cursor.execute(definition)
+
+    cursor.connection.commit()
 
 
 def collect_sources(inputs: tuple[Path, ...], recursive: bool) -> list[Path]:
-    patterns = ("*.xml", "*.xml.gz", "*.nas", "*.nas.gz")
     files: set[Path] = set()
 
     for entry in inputs:
         if entry.is_dir():
-            iterator = entry.rglob if recursive else entry.glob
-            for pattern in patterns:
-                for candidate in iterator(pattern):
-                    if candidate.is_file():
-                        files.add(candidate)
+            # one scandir pass per directory, DirEntry caches the file type from readdir
+            directories = [entry]
+            while directories:
+                with os.scandir(directories.pop()) as iterator:
+                    for candidate in iterator:
+                        if candidate.is_dir(follow_symlinks=False):
+                            if recursive:
+                                directories.append(Path(candidate.path))
+                        elif candidate.name.lower().endswith(SOURCE_SUFFIXES) and candidate.is_file():
+                            files.add(Path(candidate.path))
         elif entry.is_file():
-            name = entry.name.lower()
-            if name.endswith((".xml", ".xml.gz", ".nas", ".nas.gz")):
+            if entry.name.lower().endswith(SOURCE_SUFFIXES):
                 files.add(entry)
             else:
                 logging.debug("skipping unsupported input file %s", entry)
@@ -490,77 +1021,146 @@ def collect_sources(inputs: tuple[Path, ...], recursive: bool) -> list[Path]:
     return ordered
 
 
-def process_file(
+def init_worker(log_level: int) -> None:
+    """Prepare a parser process: logging and process-local coordinate transformations."""
+
+    global TRANSFORMER, OGR_TRANSFORMATION
+
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=log_level)
+    TRANSFORMER = pyproj.Transformer.from_crs(25832, 4326, always_xy=True)
+    OGR_TRANSFORMATION = create_ogr_transformation()
+
+
+def geometry_hash(wkb: t.Optional[bytes]) -> t.Optional[bytes]:
+    if wkb is None:
+        return None
+    return hashlib.blake2b(wkb, digest_size=GEOMETRY_HASH_SIZE).digest()
+
+
+def file_sha256(path: Path) -> bytes:
+    with open(path, "rb") as handle:
+        return hashlib.file_digest(handle, "sha256").digest()
+
+
+def parse_file_to_rows(
     path: Path,
+    previous_sha256: t.Optional[bytes] = None,
+    use_wkt: bool = False,
+    track_imports: bool = False,
+) -> ParsedFile:
+    """Parse one NAS/GML file into insertable rows without touching the database.
+
+    The file is only hashed when ``track_imports`` is set. Files whose digest
+    matches ``previous_sha256`` were imported before and are returned without
+    rows.
+    """
+
+    parsed = ParsedFile(path=path, sha256=file_sha256(path) if track_imports else None)
+
+    if parsed.sha256 is not None and parsed.sha256 == previous_sha256:
+        parsed.unchanged = True
+        return parsed
+
+    logging.info("parsing %s", path)
+
+    for parcel in iter_flurstuecke(path):
+        parsed.parcels_seen += 1
+
+        data = extract_parcel(parcel, use_wkt)
+
+        if not data:
+            parsed.parcels_skipped += 1
+            continue
+
+        if "wkb_geometry" in data:
+            data["geom_hash"] = geometry_hash(data["wkb_geometry"])
+
+        parsed.rows.append(data)
+
+    return parsed
+
+
+def process_file(
+    parsed: ParsedFile,
     cursor: PsycopgCursor,
     stats: ImportStats,
-    commit_interval: int,
     batch_size: int,
     limit: t.Optional[int],
+    track_imports: bool,
 ) -> bool:
+    """Load one parsed file through the stage, leaving the commit to the caller."""
+
+    if parsed.unchanged:
+        stats.files_unchanged += 1
+        logging.info("skipping %s, unchanged since its last import", parsed.path)
+        return True
+
     stats.files_seen += 1
-    logging.info("processing %s", path)
+    stats.parcels_seen += parsed.parcels_seen
+    stats.parcels_skipped += parsed.parcels_skipped
+    logging.info("inserting %s parcels from %s", len(parsed.rows), parsed.path)
 
-    seen_before = stats.parcels_seen
-    inserted_before = stats.parcels_inserted
-    skipped_before = stats.parcels_skipped
     errors_before = stats.errors
 
-    batch: list[dict[str, t.Any]] = []
+    rows = parsed.rows
 
-    for parcel in iter_flurstuecke(path):
-        if limit is not None and stats.parcels_inserted >= limit:
-            if batch:
-                flush_batch(cursor, batch, stats, path, commit_interval, limit)
-            return False
+    if limit is not None:
+        rows = rows[: max(limit - stats.parcels_inserted, 0)]
 
-        stats.parcels_seen += 1
+    step = batch_size if batch_size > 0 else max(len(rows), 1)
+    inserted = 0
+    staged_hashes: set[bytes] = set()
 
-        data = extract_parcel(parcel)
+    # earlier files of the open transaction survive a failing file
+    cursor.execute("SAVEPOINT parcel_file")
 
-        if not data:
-            stats.parcels_skipped += 1
-            continue
+    try:
+        for start in range(0, len(rows), step):
+            inserted += flush_batch(cursor, rows[start : start + step], staged_hashes, stats, parsed.path)
 
-        batch.append(data)
+        move_stage_rows(cursor)
+    except Exception as error:  # pragma: no cover - database runtime failures
+        logging.error("failed to load %s in bulk: %s; falling back to row inserts", parsed.path, error)
+        cursor.execute("ROLLBACK TO SAVEPOINT parcel_file")
+        stats.errors = errors_before
+        inserted = insert_rows(cursor, rows, stats)
 
-        if batch_size > 0 and len(batch) >= batch_size:
-            if not flush_batch(cursor, batch, stats, path, commit_interval, limit):
-                return False
+    # only files loaded without rejected or cut off parcels may be skipped next time
+    if track_imports and len(rows) == len(parsed.rows) and stats.errors == errors_before:
+        record_import(cursor, parsed, inserted)
 
-    if batch:
-        if not flush_batch(cursor, batch, stats, path, commit_interval, limit):
-            return False
+    cursor.execute("RELEASE SAVEPOINT parcel_file")
+    stats.parcels_inserted += inserted
 
     logging.info(
         "finished %s: seen %s, inserted %s, skipped %s, errors %s",
-        path,
-        stats.parcels_seen - seen_before,
-        stats.parcels_inserted - inserted_before,
-        stats.parcels_skipped - skipped_before,
+        parsed.path,
+        parsed.parcels_seen,
+        inserted,
+        parsed.parcels_skipped,
         stats.errors - errors_before,
     )
 
-    return True
+    return limit is None or stats.parcels_inserted < limit
 
 
 def flush_batch(
     cursor: PsycopgCursor,
-    batch: list[dict[str, t.Any]],
+    rows: list[dict[str, t.Any]],
+    staged_hashes: set[bytes],
     stats: ImportStats,
     path: Path,
-    commit_interval: int,
-    limit: t.Optional[int],
-) -> bool:
-    if not batch:
-        return True
+) -> int:
+    """Stage one batch, retrying its rows one by one if the bulk load fails."""
+
+    if not rows:
+        return 0
 
-    rows = list(batch)
-    batch.clear()
+    # A savepoint keeps a failing batch from discarding the rest of the file
+    cursor.execute("SAVEPOINT parcel_batch")
 
     try:
-        insert_batch(cursor, rows)
-        inserted = len(rows)
+        insert_batch(cursor, rows, staged_hashes)
     except Exception as error:  # pragma: no cover - database runtime failures
         logging.error(
             "failed to insert batch (%s rows) from %s: %s; falling back to row inserts",
@@ -568,38 +1168,106 @@ def flush_batch(
             path,
             error,
         )
-        cursor.connection.rollback()
-        inserted = 0
+        cursor.execute("ROLLBACK TO SAVEPOINT parcel_batch")
+        return insert_rows(cursor, rows, stats)
 
-        for row in rows:
-            try:
-                insert_parcel(cursor, row)
-            except Exception as row_error:
-                stats.errors += 1
-                logging.error(
-                    "failed to insert parcel %s: %s",
-                    row.get("adv_id"),
-                    row_error,
-                )
-                cursor.connection.rollback()
-                continue
-
-            inserted += 1
-
-            if commit_interval > 0 and (stats.parcels_inserted + inserted) % commit_interval == 0:
-                cursor.connection.commit()
-                logging.info("committed %s parcels", stats.parcels_inserted + inserted)
+    cursor.execute("RELEASE SAVEPOINT parcel_batch")
+    return len(rows)
 
-    stats.parcels_inserted += inserted
 
-    if commit_interval > 0 and stats.parcels_inserted % commit_interval == 0:
-        cursor.connection.commit()
-        logging.info("committed %s parcels", stats.parcels_inserted)
+def insert_rows(cursor: PsycopgCursor, rows: list[dict[str, t.Any]], stats: ImportStats) -> int:
+    """Insert rows individually, skipping the ones the database rejects."""
 
-    if limit is not None and stats.parcels_inserted >= limit:
-        return False
+    inserted = 0
 
-    return True
+    for row in rows:
+        cursor.execute("SAVEPOINT parcel_row")
+
+        try:
+            insert_parcel(cursor, row)
+        except Exception as error:
+            stats.errors += 1
+            logging.error("failed to insert parcel %s: %s", row.get("adv_id"), error)
+            cursor.execute("ROLLBACK TO SAVEPOINT parcel_row")
+            continue
+
+        cursor.execute("RELEASE SAVEPOINT parcel_row")
+        inserted += 1
+
+    return inserted
+
+
+def enqueue(parsed_queue: queue.Queue, item: t.Optional[ParsedFile], writer: Future) -> bool:
+    """Put ``item`` on the queue unless the writer has stopped, return whether it was queued."""
+
+    while not writer.done():
+        try:
+            parsed_queue.put(item, timeout=1.0)
+        except queue.Full:
+            continue
+        return True
+
+    return False
+
+
+def iter_parsed_files(
+    pool: ProcessPoolExecutor,
+    files: list[Path],
+    previous_digests: dict[str, bytes],
+    use_wkt: bool,
+    track_imports: bool,
+    window: int,
+) -> t.Iterator[ParsedFile]:
+    """Yield parse results in input order with at most ``window`` files in flight."""
+
+    pending: deque[Future] = deque()
+
+    for path in files:
+        pending.append(
+            pool.submit(parse_file_to_rows, path, previous_digests.get(import_log_key(path)), use_wkt, track_imports)
+        )
+
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_parsed_files(
+    parsed_queue: queue.Queue,
+    cursor: PsycopgCursor,
+    stats: ImportStats,
+    batch_size: int,
+    limit: t.Optional[int],
+    track_imports: bool,
+    commit_interval: int,
+) -> None:
+    """Insert queued files until the ``None`` sentinel or the limit is reached.
+
+    Runs on its own thread, so the next files are unpickled and queued while
+    the database is busy. Commits happen between files once at least
+    ``commit_interval`` parcels were inserted since the last commit, or only
+    at the end when it is 0.
+    """
+
+    uncommitted = 0
+
+    while (parsed := parsed_queue.get()) is not None:
+        inserted_before = stats.parcels_inserted
+        more = process_file(parsed, cursor, stats, batch_size, limit, track_imports)
+        uncommitted += stats.parcels_inserted - inserted_before
+
+        if commit_interval and uncommitted >= commit_interval:
+            cursor.connection.commit()
+            logging.info("committed %s parcels", stats.parcels_inserted)
+            uncommitted = 0
+
+        if not more:
+            logging.info("limit reached (%s parcels)", stats.parcels_inserted)
+            break
+
+    cursor.connection.commit()
 
 
 @click.command()
@@ -613,12 +1281,31 @@ def flush_batch(
     help="NAS/GML file or directory containing ALKIS downloads",
 )
 @click.option("--recursive/--no-recursive", default=True, show_default=True, help="Recurse into sub-directories when --input points to a folder")
-@click.option("--commit-interval", default=500, show_default=True, help="Number of inserts per transaction commit")
+@click.option(
+    "--commit-interval",
+    default=500,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Number of inserts per transaction commit, checked between files; 0 commits once at the end",
+)
 @click.option("--batch-size", default=200, show_default=True, help="Number of parcels to bulk insert at once")
+@click.option(
+    "--defer-indexes",
+    is_flag=True,
+    help="Drop the secondary sh_alkis_parcel indexes during the import and rebuild them afterwards (for full loads)",
+)
 @click.option("--limit", type=int, help="Stop after inserting this many parcels")
+@click.option(
+    "--skip-imported/--reimport",
+    default=True,
+    show_default=True,
+    help="Skip input files that sh_alkis_import_log lists as imported with the same SHA-256",
+)
+@click.option("--wkt", "use_wkt", is_flag=True, help="Send geometries as WKT text instead of WKB (for debugging)")
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True, type=click.IntRange(min=1), help="Number of processes parsing input files in parallel")
 @click.option("--verbose", "-v", is_flag=True, help="Enable INFO log output")
 @click.option("--debug", "-d", is_flag=True, help="Enable DEBUG log output")
-def main(env_path: Path, inputs: tuple[Path, ...], recursive: bool, commit_interval: int, batch_size: int, limit: t.Optional[int], verbose: bool, debug: bool) -> None:
+def main(env_path: Path, inputs: tuple[Path, ...], recursive: bool, commit_interval: int, batch_size: int, defer_indexes: bool, limit: t.Optional[int], skip_imported: bool, use_wkt: bool, workers: int, verbose: bool, debug: bool) -> None:
     """Insert ALKIS parcel geometries into the sh_alkis_parcel table."""
 
     configure_logging(verbose, debug)
@@ -641,20 +1328,58 @@ def main(env_path: Path, inputs: tuple[Path, ...], recursive: bool, commit_inter
 
     cursor: PsycopgCursor = conn.cursor()
 
+    create_stage_tables(cursor)
+    import_log = load_import_log(cursor)
+    index_definitions = drop_indexes(cursor) if defer_indexes else []
+    conn.commit()
+
+    previous_digests = import_log if import_log is not None and skip_imported else {}
+
+    # XML parsing is CPU bound and runs in worker processes, the database
+    # writes stay serialised on this connection in a writer thread.
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(logging.getLogger().getEffectiveLevel(),),
+    )
+    parsed_queue: queue.Queue = queue.Queue(maxsize=PARSED_QUEUE_SIZE)
+
     try:
-        for file_path in files:
-            if not process_file(file_path, cursor, stats, commit_interval, batch_size, limit):
-                logging.info("limit reached (%s parcels)", stats.parcels_inserted)
-                break
+        with ThreadPoolExecutor(max_workers=1) as writer_pool:
+            writer = writer_pool.submit(
+                write_parsed_files,
+                parsed_queue,
+                cursor,
+                stats,
+                batch_size,
+                limit,
+                import_log is not None,
+                commit_interval,
+            )
 
-        conn.commit()
+            try:
+                for parsed in iter_parsed_files(pool, files, previous_digests, use_wkt, import_log is not None, workers):
+                    if not enqueue(parsed_queue, parsed, writer):
+                        break
+            finally:
+                enqueue(parsed_queue, None, writer)
+
+            writer.result()
     finally:
-        cursor.close()
-        conn.close()
+        pool.shutdown(cancel_futures=True)
+
+        try:
+            if index_definitions:
+                conn.rollback()
+                create_indexes(cursor, index_definitions)
+        finally:
+            cursor.close()
+            conn.close()
 
     logging.info(
-        "processed %s file(s); inserted %s parcel(s); skipped %s; errors %s",
+        "processed %s file(s); unchanged %s; inserted %s parcel(s); skipped %s; errors %s",
         stats.files_seen,
+        stats.files_unchanged,
         stats.parcels_inserted,
         stats.parcels_skipped,
         stats.errors,
@@ -1,16 +1,52 @@
+import concurrent.futures
+import functools
+import io
+import itertools
+import multiprocessing
 import os
+import queue
+import struct
 import sys
+import threading
 import click
 import traceback
 import logging as log
 import psycopg2
+import pyproj
+import shapely
+import numpy as np
 import csv
 
 from datetime import datetime
 from dotenv import load_dotenv
+from psycopg2 import sql
 from pathlib import Path
 
 
+READ_BUFFER_SIZE = 1 << 20
+COPY_BUFFER_SIZE = 1 << 16
+INSERT_BATCH_SIZE = 1000
+CONVERT_QUEUE_SIZE = 4
+CONVERT_THREADS = 4
+
+# errors of the connection or server rather than of a row, they stop the load instead of being bisected
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# the target column only holds multipolygons, anything else would abort the whole chunk
+GEOMETRY_PREFIXES = ('POLYGON', 'MULTIPOLYGON')
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+
+# geometries are reprojected client side, the server only stores the EWKB
+TRANSFORMER = pyproj.Transformer.from_crs(25832, 4326, always_xy=True)
+
+PARCEL_COLUMNS = '''
+    adv_id, start_time, state_number,
+    administrative_district_number, county_number, municipality_number,
+    cadastral_district_number, field_number_original, denominator, numerator,
+    different_legal_status
+'''
+
 
 # log uncaught exceptions
 def log_exceptions(type, value, tb):
@@ -22,117 +58,656 @@ def log_exceptions(type, value, tb):
     sys.__excepthook__(type, value, tb) # calls default excepthook
 
 
-def connect_database(env_path):
-    try:
-        load_dotenv(dotenv_path=Path(env_path))
-
-        conn = psycopg2.connect(
-            database = os.getenv('DB_NAME'),
-            password = os.getenv('DB_PASS'),
-            user = os.getenv('DB_USER'),
-            host = os.getenv('DB_HOST'),
-            port = os.getenv('DB_PORT')
-        )
+def open_connection(env_path):
+    load_dotenv(dotenv_path=Path(env_path))
+
+    conn = psycopg2.connect(
+        database = os.getenv('DB_NAME'),
+        password = os.getenv('DB_PASS'),
+        user = os.getenv('DB_USER'),
+        host = os.getenv('DB_HOST'),
+        port = os.getenv('DB_PORT')
+    )
+
+    # rows are committed in chunks by read_csv instead of one transaction per statement
+    conn.autocommit = False
+
+    log.info('connection to database established')
 
-        conn.autocommit = True
+    return conn
 
-        log.info('connection to database established')
 
-        return conn
+def connect_database(env_path):
+    try:
+        return open_connection(env_path)
     except Exception as e:
         log.error(e)
 
         sys.exit(1)
 
 
+_TRUE = frozenset({'yes', 'true', 't', '1'})
+
+
 def str_to_bool(v):
-    return v.lower() in ('yes', 'true', 't', '1')
+    # postgres exports booleans as t and f, answer those without lowering
+    if v == 't':
+        return True
+
+    if v == 'f':
+        return False
+
+    return v.lower() in _TRUE
 
 
+# exports repeat a small set of timestamps, strptime is by far the slowest field conversion
+@functools.lru_cache(maxsize=1 << 16)
 def parse_datetime(s):
     return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
 
 
-def parse_value(value, conversion_func=None):
-    if value is None or value == '':
-        return None
+# csv header name and conversion of every field, in the order of the parsed row tuples
+SCHEMA = (
+    ('adv_id', None),
+    ('beginnt', parse_datetime),
+    ('land', None),
+    ('regierungsbezirk', int),
+    ('kreis', int),
+    ('gemeinde', int),
+    ('gemarkungsnummer', int),
+    ('flurnummer', None),
+    ('nenner', int),
+    ('zaehler', int),
+    ('abweichender_rechtszustand', str_to_bool),
+    ('wkt_geometry', None)
+)
+
+
+class IteratorFile(io.RawIOBase):
+    '''Readable file object that pulls its bytes from an iterator of chunks, used to feed COPY'''
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+
+        for chunk in self._chunks:
+            chunks.append(chunk)
+            length += len(chunk)
 
-    if conversion_func:
-        return conversion_func(value)
+            if 0 <= size <= length:
+                break
 
-    return value
+        data = b''.join(chunks)
 
+        if size < 0:
+            size = len(data)
 
-def insert_row(cur, row):
-    adv_id = parse_value(row.get('adv_id'))
-    start_time = parse_value(row.get('beginnt'), parse_datetime)
-    state_number = parse_value(row.get('land'))
-    administrative_district_number = parse_value(row.get('regierungsbezirk'), int)
-    county_number = parse_value(row.get('kreis'), int)
-    municipality_number = parse_value(row.get('gemeinde'), int)
-    cadastral_district_number = parse_value(row.get('gemarkungsnummer'), int)
-    field_number_original = parse_value(row.get('flurnummer'))
-    denominator = parse_value(row.get('nenner'), int)
-    numerator = parse_value(row.get('zaehler'), int)
-    different_legal_status = parse_value(row.get('abweichender_rechtszustand'), str_to_bool)
-    wkt_geometry = parse_value(row.get('wkt_geometry'))
+        self._buffer = data[size:]
 
-    if not wkt_geometry:
-        log.error(f'skipping {adv_id}: missing geometry')
+        return data[:size]
+
+
+def compile_row_converter(index, width):
+    namespace = {}
+    fields = []
+
+    # columns missing from the header point at the empty field appended to every row
+    for name, conversion in SCHEMA:
+        i = index.get(name, width)
+
+        if conversion is None:
+            fields.append(f'r[{i}] or None')
+        else:
+            namespace[conversion.__name__] = conversion
+            fields.append(f'({conversion.__name__}(r[{i}]) if r[{i}] else None)')
+
+    # generated once per header, every row is converted by a single tuple expression
+    source = f'def convert_row(r):\n    return ({", ".join(fields)})\n'
+    exec(compile(source, '<parcel row>', 'exec'), namespace)
+
+    return namespace['convert_row']
+
+
+def make_row_parser(header):
+    index = {name: i for i, name in enumerate(header)}
+    width = len(header)
+
+    convert_row = compile_row_converter(index, width)
+    i_adv_id = index.get('adv_id', width)
+    i_wkt_geometry = index.get('wkt_geometry', width)
+
+    def parse_row(row):
+        if len(row) != width:
+            log.error(f'skipping malformed row with {len(row)} instead of {width} fields')
+            return None
+
+        row.append('')
+
+        # rows without a usable geometry are rejected before any field is converted
+        wkt_geometry = row[i_wkt_geometry]
+
+        if not wkt_geometry:
+            log.error(f'skipping {row[i_adv_id]}: missing geometry')
+            return None
+
+        if not wkt_geometry.startswith(GEOMETRY_PREFIXES):
+            log.error(f'skipping {row[i_adv_id]}: unexpected geometry {wkt_geometry[:20]}')
+            return None
+
+        return convert_row(row)
+
+    return parse_row
+
+
+def iter_parsed_rows(reader):
+    header = next(reader, None)
+
+    if header is None:
         return
 
-    sql = '''
-        INSERT INTO sh_alkis_parcel (adv_id, start_time, state_number,
-            administrative_district_number, county_number, municipality_number,
-            cadastral_district_number, field_number_original, denominator, numerator,
-            different_legal_status, wkb_geometry)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-            ST_AsBinary(
-                ST_Multi(ST_Transform(ST_GeomFromText(%s, 25832), 4326))
-            )) RETURNING id
-    '''
+    parse_row = make_row_parser(header)
+
+    for row in reader:
+        # blank lines come back as empty lists
+        if not row:
+            continue
+
+        parsed = parse_row(row)
+
+        if parsed is not None:
+            yield parsed
+
+
+def transform_coords(coords):
+    x, y = TRANSFORMER.transform(coords[:, 0], coords[:, 1])
+
+    return np.column_stack((x, y))
+
+
+def wkt_to_wkb(wkt_geometries):
+    # malformed or empty geometries become None, convert_geometries drops their rows
+    geometries = shapely.from_wkt(wkt_geometries, on_invalid='ignore')
+    geometries[shapely.is_empty(geometries)] = None
+    geometries = shapely.transform(geometries, transform_coords)
+
+    # same as ST_Multi, the target column only accepts multipolygons, most exports already are
+    if not all(wkt[:12] == 'MULTIPOLYGON' for wkt in wkt_geometries):
+        polygons = shapely.get_type_id(geometries) == shapely.GeometryType.POLYGON
+        geometries[polygons] = shapely.multipolygons(geometries[polygons], indices=np.arange(polygons.sum()))
+
+    geometries = shapely.set_srid(geometries, 4326)
+
+    return shapely.to_wkb(geometries, include_srid=True)
+
+
+def convert_geometries(rows):
+    wkb_geometries = wkt_to_wkb([parsed[-1] for parsed in rows])
+
+    converted = []
+
+    for parsed, wkb in zip(rows, wkb_geometries):
+        if wkb is None:
+            log.error(f'skipping {parsed[0]}: invalid geometry')
+            continue
+
+        converted.append((*parsed[:-1], wkb))
+
+    return converted
+
+
+def encode_text(value):
+    data = value.encode('utf-8')
+
+    return struct.pack('!i', len(data)) + data
+
+
+def encode_bytes(value):
+    return struct.pack('!i', len(value)) + value
+
+
+def encode_int(value):
+    return struct.pack('!ii', 4, value)
+
+
+def encode_bool(value):
+    return struct.pack('!i?', 1, value)
+
+
+def encode_timestamp(value):
+    # microseconds since the postgres epoch
+    delta = value - POSTGRES_EPOCH
+
+    return struct.pack('!iq', 8, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+# binary encoders in the column order of the staging table
+COPY_ENCODERS = (
+    encode_text, encode_timestamp, encode_text, encode_int, encode_int, encode_int,
+    encode_int, encode_text, encode_int, encode_int, encode_bool, encode_bytes
+)
+
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+COPY_FIELD_COUNT = struct.pack('!h', len(COPY_ENCODERS))
+COPY_NULL = struct.pack('!i', -1)
+
+
+def iter_copy_data(rows):
+    yield COPY_HEADER
+
+    for parsed in rows:
+        # the text format left out of range numbers to the server, here they fail the encoder
+        try:
+            data = b''.join(
+                COPY_NULL if value is None else encode(value)
+                for encode, value in zip(COPY_ENCODERS, parsed)
+            )
+        except struct.error as e:
+            log.error(f'skipping {parsed[0]}: {e}')
+            continue
+
+        yield COPY_FIELD_COUNT + data
+
+    yield COPY_TRAILER
+
+
+def create_stage_table(cur):
+    cur.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS sh_alkis_parcel_stage (
+            adv_id VARCHAR,
+            -- without time zone, the insert applies the session time zone like the other method
+            start_time TIMESTAMP,
+            state_number VARCHAR,
+            administrative_district_number INT,
+            county_number INT,
+            municipality_number INT,
+            cadastral_district_number INT,
+            field_number_original VARCHAR,
+            denominator INT,
+            numerator INT,
+            different_legal_status BOOLEAN,
+            wkb_geometry BYTEA
+        )
+    ''')
+
+
+def copy_rows(cur, rows):
+    # a rejected row rolls back the whole COPY, the chunk is then inserted in bisected batches
+    cur.execute('SAVEPOINT parcel_copy')
 
     try:
-        cur.execute(sql, (adv_id, start_time, state_number, administrative_district_number,
-            county_number, municipality_number, cadastral_district_number, field_number_original,
-            denominator, numerator, different_legal_status, wkt_geometry))
+        # the rows are streamed into the staging table with a single binary COPY, the server parses no text
+        cur.copy_expert(
+            f'COPY sh_alkis_parcel_stage ({PARCEL_COLUMNS}, wkb_geometry) FROM STDIN WITH (FORMAT BINARY)',
+            IteratorFile(iter_copy_data(rows)),
+            size=COPY_BUFFER_SIZE
+        )
+
+        cur.execute(f'''
+            INSERT INTO sh_alkis_parcel ({PARCEL_COLUMNS}, wkb_geometry)
+            SELECT {PARCEL_COLUMNS}, wkb_geometry
+            FROM sh_alkis_parcel_stage
+        ''')
+    except CONNECTION_ERRORS:
+        raise
+    except psycopg2.Error as e:
+        cur.execute('ROLLBACK TO SAVEPOINT parcel_copy')
+        cur.execute('RELEASE SAVEPOINT parcel_copy')
+
+        log.warning(f'copy of {len(rows)} parcels failed, inserting them in batches: {e.diag.message_primary}')
+
+        return insert_rows(cur, rows)
+
+    inserted = cur.rowcount
+
+    cur.execute('TRUNCATE sh_alkis_parcel_stage')
+    cur.execute('RELEASE SAVEPOINT parcel_copy')
+
+    return inserted, 1
+
+
+def prepare_copy(cur):
+    create_stage_table(cur)
 
-        last_inserted_id = cur.fetchone()[0]
+    # used when a chunk has to fall back to batched inserts
+    prepare_insert(cur)
 
-        log.info(f'inserted {adv_id} with id {last_inserted_id}')
+
+def prepare_insert(cur):
+    # parsed and planned once per session, every batch is passed as one array per column
+    cur.execute(f'''
+        PREPARE parcel_ins (
+            varchar[], timestamptz[], varchar[], int[], int[], int[],
+            int[], varchar[], int[], int[], boolean[], bytea[]
+        ) AS
+        INSERT INTO sh_alkis_parcel ({PARCEL_COLUMNS}, wkb_geometry)
+        SELECT {PARCEL_COLUMNS}, wkb_geometry
+        FROM unnest($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+            AS parcel ({PARCEL_COLUMNS}, wkb_geometry)
+    ''')
+
+
+def insert_batch(cur, batch):
+    columns = [list(column) for column in zip(*batch)]
+
+    # a failing row only rolls back its own batch, which is then split until the row is found
+    cur.execute('SAVEPOINT parcel_batch')
+
+    try:
+        # the casts type arrays that only hold NULLs
+        cur.execute('''
+            EXECUTE parcel_ins (
+                %s::varchar[], %s::timestamptz[], %s::varchar[], %s::int[], %s::int[], %s::int[],
+                %s::int[], %s::varchar[], %s::int[], %s::int[], %s::boolean[], %s::bytea[]
+            )
+        ''', columns)
+    except CONNECTION_ERRORS:
+        raise
+    except psycopg2.Error as e:
+        cur.execute('ROLLBACK TO SAVEPOINT parcel_batch')
+        cur.execute('RELEASE SAVEPOINT parcel_batch')
+
+        if len(batch) == 1:
+            log.error(f'skipping {batch[0][0]}: {e.diag.message_primary}')
+            return 0
+
+        middle = len(batch) // 2
+
+        return insert_batch(cur, batch[:middle]) + insert_batch(cur, batch[middle:])
+
+    inserted = cur.rowcount
+
+    cur.execute('RELEASE SAVEPOINT parcel_batch')
+
+    if log.getLogger().isEnabledFor(log.DEBUG):
+        log.debug(f'inserted {inserted} parcels from {batch[0][0]} to {batch[-1][0]}')
+
+    return inserted
+
+
+def insert_rows(cur, rows):
+    inserted = 0
+    batches = 0
+    batch = []
+
+    for parsed in rows:
+        batch.append(parsed)
+
+        if len(batch) == INSERT_BATCH_SIZE:
+            inserted += insert_batch(cur, batch)
+            batches += 1
+            batch = []
+
+    if batch:
+        inserted += insert_batch(cur, batch)
+        batches += 1
+
+    return inserted, batches
+
+
+# method name: (session setup, chunk loader returning inserted rows and statements)
+LOADERS = {
+    'copy': (prepare_copy, copy_rows),
+    'insert': (prepare_insert, insert_rows)
+}
+
+
+def drop_indexes(conn):
+    cur = conn.cursor()
+
+    # indexes backing a constraint like the primary key are kept
+    cur.execute('''
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'sh_alkis_parcel'::regclass
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        ORDER BY c.relname
+    ''')
+
+    definitions = cur.fetchall()
+
+    for name, _ in definitions:
+        log.info(f'dropping index {name} until the load is done')
+        cur.execute(sql.SQL('DROP INDEX {}').format(sql.Identifier(name)))
+
+    conn.commit()
+
+    return definitions
+
+
+def set_logged(conn, logged):
+    cur = conn.cursor()
+
+    log.info(f'setting sh_alkis_parcel {"logged" if logged else "unlogged"}')
+    cur.execute(f'ALTER TABLE sh_alkis_parcel SET {"LOGGED" if logged else "UNLOGGED"}')
+
+    conn.commit()
+
+
+def create_indexes(conn, definitions):
+    cur = conn.cursor()
+
+    for name, definition in definitions:
+        log.info(f'creating index {name}')
+        cur.execute(definition)
+
+    conn.commit()
+
+
+def iter_chunks(rows, size):
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def enqueue(chunk_queue, item, stopped):
+    while not stopped.is_set():
+        try:
+            chunk_queue.put(item, timeout=1.0)
+        except queue.Full:
+            continue
+
+        return True
+
+    return False
+
+
+def convert_chunks(rows, commit_interval, executor, chunk_queue, stopped):
+    # csv parsing runs in this thread and the geometries in the executor, both
+    # overlap with the database round trips of the loading thread
+    try:
+        for chunk in iter_chunks(rows, commit_interval):
+            if not enqueue(chunk_queue, executor.submit(convert_geometries, chunk), stopped):
+                return
     except Exception as e:
-        log.error(e)
+        failed = concurrent.futures.Future()
+        failed.set_exception(e)
+        enqueue(chunk_queue, failed, stopped)
+
+        return
+
+    enqueue(chunk_queue, None, stopped)
 
 
-def read_csv(conn, src):
+def load_rows(conn, rows, method, commit_interval, fast_load):
     cur = conn.cursor()
+    setup, load = LOADERS[method]
+    inserted = 0
+    batches = 0
+
+    # futures of converted chunks in file order, bounded so the reader cannot run far ahead
+    chunk_queue = queue.Queue(maxsize=CONVERT_QUEUE_SIZE)
+    stopped = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONVERT_THREADS)
+    reader = threading.Thread(
+        target=convert_chunks,
+        args=(rows, commit_interval, executor, chunk_queue, stopped),
+        daemon=True
+    )
+
+    reader.start()
+
+    try:
+        if fast_load:
+            # commits return before their WAL is flushed, a crash loses the last chunks
+            cur.execute('SET synchronous_commit = off')
+
+        setup(cur)
+
+        # rejected rows are skipped by the loaders, anything raised here stops the load
+        # and only the chunks committed so far stay in the table
+        while (converted := chunk_queue.get()) is not None:
+            chunk_inserted, chunk_batches = load(cur, converted.result())
+            inserted += chunk_inserted
+            batches += chunk_batches
+            conn.commit()
+
+            log.info(f'committed {inserted} parcels')
+    except Exception:
+        # a lost connection has nothing left to roll back
+        if not conn.closed:
+            conn.rollback()
+
+        raise
+    finally:
+        stopped.set()
+        reader.join()
+        executor.shutdown(cancel_futures=True)
+
+    return inserted, batches
+
+
+def read_csv(conn, src, method, commit_interval, fast_load):
+    with open(src, 'rb', buffering=READ_BUFFER_SIZE) as raw, \
+            io.TextIOWrapper(raw, encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile, delimiter=',')
+        inserted, batches = load_rows(conn, iter_parsed_rows(reader), method, commit_interval, fast_load)
+
+    log.info(f'inserted {inserted} parcels in {batches} batches from {src}')
+
+
+def read_header(src):
+    with open(src, 'rb') as raw:
+        line = raw.readline()
+
+    header = next(csv.reader([line.decode('utf-8')], delimiter=','), [])
+
+    if 'wkt_geometry' not in header:
+        log.error(f'{src} has no wkt_geometry column in its header')
+
+        sys.exit(1)
+
+    return header, len(line)
+
 
-    with open(src, newline='') as csvfile:
-        reader = csv.DictReader(csvfile, delimiter=',')
-    
-        for row in reader:
-            insert_row(cur, row)
+def split_offsets(start, end, count):
+    step = max((end - start) // count, 1)
+    offsets = list(range(start, end, step))[:count]
+
+    return list(zip(offsets, offsets[1:] + [end]))
+
+
+def iter_chunk_lines(raw, start, end):
+    # a chunk owns every line that starts inside it, a partial first line belongs to the previous chunk
+    raw.seek(start - 1)
+
+    if raw.read(1) != b'\n':
+        raw.readline()
+
+    while raw.tell() < end:
+        line = raw.readline()
+
+        if not line:
+            break
+
+        yield line.decode('utf-8')
+
+
+def load_chunk(task):
+    env, src, header, start, end, method, commit_interval, fast_load = task
+
+    # raises instead of exiting, a SystemExit would kill the pool worker and hang the parent
+    conn = open_connection(env)
+
+    try:
+        with open(src, 'rb', buffering=READ_BUFFER_SIZE) as raw:
+            reader = csv.reader(iter_chunk_lines(raw, start, end), delimiter=',')
+            rows = iter_parsed_rows(itertools.chain([header], reader))
+
+            return load_rows(conn, rows, method, commit_interval, fast_load)
+    finally:
+        conn.close()
+
+
+def read_csv_parallel(env, src, method, commit_interval, fast_load, workers):
+    # chunks are split on byte offsets, so quoted fields must not contain line breaks
+    header, data_start = read_header(src)
+    chunks = split_offsets(data_start, src.stat().st_size, workers)
+    tasks = [(env, src, header, start, end, method, commit_interval, fast_load) for start, end in chunks]
+    inserted = 0
+    batches = 0
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        for chunk_inserted, chunk_batches in pool.imap_unordered(load_chunk, tasks):
+            inserted += chunk_inserted
+            batches += chunk_batches
+
+            log.info(f'worker finished chunk with {chunk_inserted} parcels')
+
+    log.info(f'inserted {inserted} parcels in {batches} batches from {src} with {workers} workers')
 
 
 @click.command()
 @click.option('--env', '-e', type=str, required=True, help='Set your local dot env path')
 @click.option('--src', '-s', type=click.Path(exists=True), required=True, help='Set src path to your csv')
+@click.option('--method', '-m', type=click.Choice(list(LOADERS)), default='copy', show_default=True, help='Load rows with COPY through a staging table or with batched INSERT statements')
+@click.option('--commit-interval', default=10000, show_default=True, type=click.IntRange(min=1), help='Number of rows per transaction commit')
+@click.option('--rebuild-indexes', is_flag=True, help='Drop the secondary indexes before the load and create them again afterwards')
+@click.option('--fast-load', is_flag=True, help='Load into an unlogged table without synchronous commits, rerun the load after a crash')
+@click.option('--workers', '-w', default=1, show_default=True, type=click.IntRange(min=1), help='Number of worker processes, each loading a part of the csv over its own connection')
 @click.option('--verbose', '-v', is_flag=True, help='Print more verbose output')
 @click.option('--debug', '-d', is_flag=True, help='Print detailed debug output')
-def main(env, src, verbose, debug):
-    if debug:
-        log.basicConfig(format='%(levelname)s: %(message)s', level=log.DEBUG)
+def main(env, src, method, commit_interval, rebuild_indexes, fast_load, workers, verbose, debug):
+    # basicConfig only configures once, so the level is decided up front
+    level = log.DEBUG if debug else (log.INFO if verbose else log.WARNING)
+    log.basicConfig(format='%(levelname)s: %(message)s', level=level)
+
     if verbose:
-        log.basicConfig(format='%(levelname)s: %(message)s', level=log.INFO)
         log.info(f'set logging level to verbose')
-    else:
-        log.basicConfig(format='%(levelname)s: %(message)s')
 
     recursion_limit = sys.getrecursionlimit()
     log.info(f'your system recursion limit: {recursion_limit}')
 
     conn = connect_database(env)
-    data = read_csv(conn, Path(src))
+
+    # an unlogged table skips the WAL, but is truncated when the server crashes
+    if fast_load:
+        set_logged(conn, False)
+
+    index_definitions = drop_indexes(conn) if rebuild_indexes else []
+
+    try:
+        if workers > 1:
+            # the workers open their own connections
+            read_csv_parallel(env, Path(src), method, commit_interval, fast_load, workers)
+        else:
+            data = read_csv(conn, Path(src), method, commit_interval, fast_load)
+    finally:
+        if not conn.closed:
+            conn.rollback()
+
+        if index_definitions:
+            create_indexes(conn, index_definitions)
+
+        if fast_load:
+            set_logged(conn, True)
 
 
 if __name__ == '__main__':